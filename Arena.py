@@ -0,0 +1,228 @@
+import numpy as np
+import Node
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    # Without numba the kernels below still run, as plain (slow) Python loops
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        return lambda func: func
+
+
+@njit(cache=True)
+def _build(data, root, freq, child_head, child_next, child_sym, n_nodes, max_steps, max_depth):
+    # Same state machine as LZ_MIDI_data.build_tree, on the arena arrays.
+    # The caller guarantees room for len(data) new nodes.
+    cur = root
+    steps = 0
+    depth = 0
+    for symbol in data:
+        prev = -1
+        child = child_head[cur]
+        while child != -1 and child_sym[child] != symbol:
+            prev = child
+            child = child_next[child]
+        if child != -1:
+            freq[cur] += 1
+            cur = child
+            depth += 1
+            if depth == max_depth:
+                cur = root
+                depth = 0
+        else:
+            # Append after the last sibling to keep the children in insertion order
+            new = n_nodes
+            n_nodes += 1
+            freq[new] = 1
+            child_sym[new] = symbol
+            if prev == -1:
+                child_head[cur] = new
+            else:
+                child_next[prev] = new
+            cur = new
+            steps += 1
+            if steps == max_steps:
+                cur = root
+                steps = 0
+    return n_nodes
+
+
+@njit(cache=True)
+def _child_totals(freq, child_head, child_next, n_nodes):
+    # Summed freq of each node's children, the denominator for sampling
+    totals = np.zeros(n_nodes, dtype=np.int64)
+    for i in range(n_nodes):
+        child = child_head[i]
+        while child != -1:
+            totals[i] += freq[child]
+            child = child_next[child]
+    return totals
+
+
+@njit(cache=True)
+def _sample_path(freq, child_head, child_next, child_sym, totals, roots, uniforms, tree_choices,
+                 sentence, sequence_lengths):
+    # Same walk as LZ_MIDI_data.create_sentence, on the arena arrays. Fills
+    # sentence and sequence_lengths and returns the number of leaf restarts.
+    cur = roots[tree_choices[0]]
+    leaf_restarts = 0
+    last_restart = 0
+    for i in range(len(uniforms)):
+        if child_head[cur] == -1:
+            sequence_lengths[leaf_restarts] = i - last_restart
+            leaf_restarts += 1
+            last_restart = i
+            cur = roots[tree_choices[leaf_restarts]]
+        # First child whose cumulative freq exceeds the threshold, like the
+        # bisect in Node.cumulative_weights
+        t = uniforms[i] * totals[cur]
+        child = child_head[cur]
+        acc = freq[child]
+        while t >= acc and child_next[child] != -1:
+            child = child_next[child]
+            acc += freq[child]
+        cur = child
+        sentence[i] = child_sym[cur]
+    return leaf_restarts
+
+
+class Arena:
+    """
+    A set of LZ trees stored in flat NumPy arrays instead of Node objects.
+
+    Node i has the frequency freq[i], the symbol id on its incoming edge
+    child_sym[i], its first child child_head[i] and its next sibling
+    child_next[i] (-1 for none). roots holds the index of every tree's root.
+    Symbols must be the integer ids produced by Utils.encode_symbols.
+    """
+
+    def __init__(self, capacity=1024):
+        self.freq = np.zeros(capacity, dtype=np.int32)
+        self.child_head = np.full(capacity, -1, dtype=np.int32)
+        self.child_next = np.full(capacity, -1, dtype=np.int32)
+        self.child_sym = np.zeros(capacity, dtype=np.int32)
+        self.n_nodes = 0
+        self.roots = []
+        self._totals = None
+
+    @classmethod
+    def merge(cls, arenas):
+        """
+        Concatenates several arenas into one holding all of their trees.
+        """
+        merged = cls(capacity=0)
+        offset = 0
+        freq, child_head, child_next, child_sym = [], [], [], []
+        for arena in arenas:
+            n = arena.n_nodes
+
+            def shift(links):
+                return np.where(links[:n] == -1, -1, links[:n] + offset).astype(np.int32)
+
+            freq.append(arena.freq[:n])
+            child_head.append(shift(arena.child_head))
+            child_next.append(shift(arena.child_next))
+            child_sym.append(arena.child_sym[:n])
+            merged.roots.extend(root + offset for root in arena.roots)
+            offset += n
+
+        merged.freq = np.concatenate(freq)
+        merged.child_head = np.concatenate(child_head)
+        merged.child_next = np.concatenate(child_next)
+        merged.child_sym = np.concatenate(child_sym)
+        merged.n_nodes = offset
+        return merged
+
+    def _reserve(self, extra):
+        capacity = max(len(self.freq), 1)
+        needed = self.n_nodes + extra
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        grow = capacity - len(self.freq)
+        self.freq = np.concatenate((self.freq, np.zeros(grow, dtype=np.int32)))
+        self.child_head = np.concatenate(
+            (self.child_head, np.full(grow, -1, dtype=np.int32)))
+        self.child_next = np.concatenate(
+            (self.child_next, np.full(grow, -1, dtype=np.int32)))
+        self.child_sym = np.concatenate(
+            (self.child_sym, np.zeros(grow, dtype=np.int32)))
+
+    def new_tree(self):
+        self._reserve(1)
+        root = self.n_nodes
+        self.n_nodes += 1
+        self.roots.append(root)
+        return root
+
+    def build_tree(self, data, root, max_steps=1, max_depth=None):
+        """
+        Adds one song to the tree starting at root, see LZ_MIDI_data.build_tree.
+        """
+        data = np.asarray(data, dtype=np.int32)
+        self._reserve(len(data))
+        self._totals = None
+        self.n_nodes = _build(data, root, self.freq, self.child_head, self.child_next,
+                              self.child_sym, self.n_nodes,
+                              -1 if max_steps is None else max_steps,
+                              -1 if max_depth is None else max_depth)
+
+    def create_sentence(self, sentence_length=100, rng=None):
+        """
+        Arena counterpart of LZ_MIDI_data.create_sentence, running the walk in
+        a JIT-compiled loop. It samples the same distribution, but not the same
+        draws, so one seed gives different sentences on the two paths.
+
+        Returns:
+            tuple: (sentence as a list of symbol ids, number of leaf restarts,
+                    list of sequence lengths)
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+        roots = np.asarray(self.roots, dtype=np.int32)
+        # Like LZ_MIDI_data.create_sentence, leave out the trees without children
+        roots = roots[self.child_head[roots] != -1]
+        if not len(roots):
+            raise ValueError("Cannot sample from an empty tree")
+        if self._totals is None:
+            self._totals = _child_totals(self.freq, self.child_head, self.child_next,
+                                         self.n_nodes)
+
+        uniforms = rng.random(sentence_length)
+        tree_choices = rng.integers(len(roots), size=sentence_length + 1)
+        sentence = np.empty(sentence_length, dtype=np.int32)
+        sequence_lengths = np.empty(sentence_length, dtype=np.int64)
+        leaf_restarts = _sample_path(self.freq, self.child_head, self.child_next, self.child_sym,
+                                     self._totals, roots, uniforms, tree_choices,
+                                     sentence, sequence_lengths)
+        return sentence.tolist(), leaf_restarts, sequence_lengths[:leaf_restarts].tolist()
+
+    def to_nodes(self):
+        """
+        Converts every tree into Node objects, keeping the children order.
+
+        Returns:
+            list: One root Node per tree, in the order of roots.
+        """
+        freq = self.freq.tolist()
+        child_head = self.child_head.tolist()
+        child_next = self.child_next.tolist()
+        child_sym = self.child_sym.tolist()
+
+        trees = []
+        for root in self.roots:
+            tree = Node.Node(freq[root], None)
+            stack = [(root, tree)]
+            while stack:
+                i, node = stack.pop()
+                child = child_head[i]
+                while child != -1:
+                    stack.append(
+                        (child, node.create_child(freq[child], child_sym[child])))
+                    child = child_next[child]
+            trees.append(tree)
+        return trees
@@ -1,101 +1,154 @@
 from pathlib import Path
 import json
-from Utils import load_midi, calculate_box_plot_stats
-import random
+from Utils import load_midi_ids, calculate_box_plot_stats
+import numpy as np
 import Node
+import Arena
 from maestro_to_vector import play_midi_pitches, note_vector_to_midi_pitches
-import sys
+import os
+import multiprocessing as mp
 import Visualize
 
 
 def build_tree(data, Tree, max_steps=1, max_depth=None):
-    # Data: list of symbols
+    # Data: list of symbols, already cut at the first 0 interval by load_midi_ids
     cur_branch = Tree
+    parent = None
     steps = 0
     depth = 0
+    # Hoist the method lookups out of the loop
+    reset_weights = Node.Node.reset_weights
+    create_child = Node.Node.create_child
     for symbol in data:
-        if not symbol:
-            return
-        if symbol in cur_branch.children_symbols:
+        child = cur_branch.children_map.get(symbol)
+        if child is not None:
             cur_branch.freq += 1
-            cur_branch = cur_branch.find_child_by_symbol(symbol)
+            if parent is not None:
+                # cur_branch's sampling weight changed, drop the parent's tables
+                reset_weights(parent)
+            parent = cur_branch
+            cur_branch = child
             depth += 1
             if depth == max_depth:
                 cur_branch = Tree
+                parent = None
                 depth = 0
         else:
-            cur_branch = cur_branch.create_child(1, symbol)
+            parent = cur_branch
+            cur_branch = create_child(cur_branch, 1, symbol)
             steps += 1
             if steps == max_steps:
                 cur_branch = Tree
+                parent = None
                 steps = 0
 
 
-def create_sentence(Trees, sentence_length=100):
-    cur_context = random.choice(Trees)
+def _build_one(songs, max_steps, max_depth):
+    # Pool worker: builds one tree in its own arena, which pickles back to the
+    # parent as four flat arrays instead of a deep graph of Node objects
+    arena = Arena.Arena()
+    root = arena.new_tree()
+    for notes in songs:
+        arena.build_tree(notes, root, max_steps=max_steps, max_depth=max_depth)
+    return arena
+
+
+def create_sentence(Trees, sentence_length=100, rng=None):
+    # All random numbers for the sentence are drawn up front in two NumPy
+    # calls: one uniform per step and one tree index per possible restart.
+    # Only a rejected proposal of a Bernoulli race draws more, from rng.
+    if rng is None:
+        rng = np.random.default_rng()
+    # A tree whose songs were all empty has no children to sample; it is left
+    # out of the draws, here and in Arena.create_sentence alike
+    Trees = [tree for tree in Trees if not tree.is_leaf()]
+    if not Trees:
+        raise ValueError("Cannot sample from an empty tree")
+    uniforms = rng.random(sentence_length).tolist()
+    tree_choices = rng.integers(len(Trees), size=sentence_length + 1).tolist()
+    cur_context = Trees[tree_choices[0]]
     sentence = []
     leaf_restarts = 0
+    last_restart = 0
     sequence_lengths = []
-    for i in range(sentence_length):
-        if cur_context.is_leaf():
+    # Hoist the per-step method lookups out of the loop
+    is_leaf = Node.Node.is_leaf
+    sample_child = Node.Node.sample_child
+    append = sentence.append
+    for i, u in enumerate(uniforms):
+        if is_leaf(cur_context):
             leaf_restarts += 1
-            sequence_lengths.append(
-                i-sum(sequence_lengths))
+            sequence_lengths.append(i - last_restart)
+            last_restart = i
             # Reached a leaf node
             # print("Reached leaf, restarting, current run:\n", sentence)
-            cur_context = random.choice(Trees)
-        symbols = cur_context.children_symbols
-        total_seen = sum([child.freq for child in cur_context.children])
-        probabilities = [cur_context.find_child_by_symbol(
-            s).freq / total_seen for s in symbols]
-        next_symbol = random.choices(symbols, probabilities)[0]
-        sentence.append(next_symbol)
-        cur_context = cur_context.find_child_by_symbol(next_symbol)
+            cur_context = Trees[tree_choices[leaf_restarts]]
+        cur_context = sample_child(cur_context, u, rng)
+        append(cur_context.symbol)
     return sentence, leaf_restarts, sequence_lengths
 
 
 def lz_synth_main(number_of_songs_per_tree=200, sentence_length=100, number_of_sentences=1,
-                  max_depth=None, steps=1, play_song=False, get_data=False, get_sequence_lengths=False):
-
-    try:
-        sys.setrecursionlimit(10000)
-    except Exception as e:
-        print(f"Warning: Could not set recursion limit. {e}")
+                  max_depth=None, steps=1, play_song=False, get_data=False, get_sequence_lengths=False,
+                  seed=None):
+    # One generator drives the shuffle and all sampling, so a seed reproduces a run
+    rng = np.random.default_rng(seed)
 
     graph_data = []
     # for number_of_songs_per_tree in [2, 4, 8, 16, 32, 64, 128, 256, 512, 1200]:
     print(f"\n\nBuilding with {number_of_songs_per_tree} songs per tree:")
-    midi_notes_per_song = load_midi()
-    random.shuffle(midi_notes_per_song)
+    midi_notes_per_song, vocabulary = load_midi_ids()
+    rng.shuffle(midi_notes_per_song)
     Trees = []
 
     tot_songs = len(midi_notes_per_song)
 
-    for i in range(tot_songs//number_of_songs_per_tree):
-        Tree = Node.Node(0, None)
-        for notes in midi_notes_per_song[i*number_of_songs_per_tree:min((i+1)*number_of_songs_per_tree, tot_songs)]:
-            build_tree(notes, Tree, max_steps=steps,
-                       max_depth=max_depth)
-        Trees.append(Tree)
+    chunks = [midi_notes_per_song[i*number_of_songs_per_tree:min((i+1)*number_of_songs_per_tree, tot_songs)]
+              for i in range(tot_songs//number_of_songs_per_tree)]
+    if not chunks:
+        raise ValueError(
+            f"Not enough songs to build a tree: {tot_songs} song(s) loaded, "
+            f"{number_of_songs_per_tree} needed per tree")
+    if Arena.NUMBA_AVAILABLE:
+        # The trees are independent: build them in parallel in JIT-compiled
+        # arenas, and sample from the merged arena as well
+        with mp.Pool(min(os.cpu_count() or 1, len(chunks))) as pool:
+            arenas = pool.starmap(
+                _build_one, [(chunk, steps, max_depth) for chunk in chunks])
+        arena = Arena.Arena.merge(arenas)
+    else:
+        for chunk in chunks:
+            Tree = Node.Node(0, None)
+            for notes in chunk:
+                # Python ints hash faster than NumPy scalars as dict keys
+                build_tree(notes.tolist(), Tree, max_steps=steps,
+                           max_depth=max_depth)
+            Trees.append(Tree)
     song_restarts = []
     sentences = []
     sequence_lengths = []
     for i in range(number_of_sentences):
-        sentence, restarts, sequence_lengths = create_sentence(
-            Trees, sentence_length)
+        if Arena.NUMBA_AVAILABLE:
+            sentence, restarts, sequence_lengths = arena.create_sentence(
+                sentence_length, rng)
+        else:
+            sentence, restarts, sequence_lengths = create_sentence(
+                Trees, sentence_length, rng)
         song_restarts.append(restarts)
         sentences.append(sentence)
 
     if play_song:
-        absolute_pitches = note_vector_to_midi_pitches(sentences[0])
+        absolute_pitches = note_vector_to_midi_pitches(
+            [vocabulary[s] for s in sentences[0]])
         play_midi_pitches(absolute_pitches, duration=0.5)
 
     if get_data:
+        if Arena.NUMBA_AVAILABLE:
+            # The metrics are computed on Node trees
+            Trees = arena.to_nodes()
         metrics = []
         for tree in Trees:
-            metric = tree.analyze_tree_metrics()
-            metric["Total freq"] = sum(child.freq for child in tree.children)
-            metrics.append(metric)
+            metrics.append(tree.analyze_tree_metrics())
 
         box_metrics = {}
         for metric in metrics[0].keys():
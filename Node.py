@@ -0,0 +1,197 @@
+from array import array
+from bisect import bisect
+from collections import deque
+from itertools import accumulate
+
+# Nodes with at least this many children are sampled through an alias table,
+# or a Bernoulli race when their weights are flat; smaller ones through a
+# bisect on the cumulative weights.
+ALIAS_MIN_CHILDREN = 8
+# A node's weights count as flat when max freq / mean freq is at most this,
+# which bounds the expected number of race attempts.
+RACE_MAX_RATIO = 2
+
+
+class Node:
+    """
+    A single node of the LZ prefix tree.
+
+    Each node stores the symbol on the edge that leads to it and a frequency
+    counter. Children live in a single dict, children_map, keyed by symbol, so
+    membership checks and lookups are one hash operation. children and
+    children_symbols are views of it, in insertion order.
+
+    The sampling tables (the children as an indexable list in _child_list,
+    cumulative weights in _cum/_total, the largest child freq in _max_freq and
+    the alias table in _alias_prob/_alias_idx) are built lazily and dropped by reset_weights
+    whenever a child is added or a child's freq changes.
+
+    A tree has one Node per distinct prefix, so __slots__ keeps each instance
+    free of a per-object __dict__.
+    """
+
+    __slots__ = ('freq', 'symbol', 'children_map', '_child_list', '_cum', '_total',
+                 '_max_freq', '_alias_prob', '_alias_idx')
+
+    def __init__(self, freq, symbol):
+        self.freq = freq
+        self.symbol = symbol
+        self.children_map = {}
+        self._child_list = None
+        self._cum = None
+        self._total = 0
+        self._max_freq = None
+        self._alias_prob = None
+        self._alias_idx = None
+
+    def create_child(self, freq, symbol):
+        node = Node(freq, symbol)
+        self.children_map[symbol] = node
+        self._child_list = None
+        self.reset_weights()
+        return node
+
+    @property
+    def children(self):
+        return self.children_map.values()
+
+    @property
+    def children_symbols(self):
+        return self.children_map.keys()
+
+    def find_child_by_symbol(self, s):
+        return self.children_map[s]
+
+    def is_leaf(self):
+        return not self.children_map
+
+    def reset_weights(self):
+        self._cum = None
+        self._max_freq = None
+        self._alias_prob = None
+        self._alias_idx = None
+
+    def cumulative_weights(self):
+        """
+        Returns the running sum of the children's freq and its total, building
+        and caching them on first use after the last change.
+        """
+        if self._cum is None:
+            self._cum = list(accumulate(child.freq for child in self.children))
+            self._total = self._cum[-1]
+        return self._cum, self._total
+
+    def build_alias(self):
+        """
+        Builds the Walker/Vose alias table for the children's freq, so a child
+        can be drawn in O(1) regardless of the fan-out.
+        """
+        n = len(self.children)
+        total = sum(child.freq for child in self.children)
+        scaled = [child.freq * n / total for child in self.children]
+        prob = array('d', [1.0]) * n
+        alias = array('i', range(n))
+
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            prob[s] = scaled[s]
+            alias[s] = l
+            scaled[l] += scaled[s] - 1.0
+            if scaled[l] < 1.0:
+                small.append(l)
+            else:
+                large.append(l)
+        # Whatever is left over is 1.0 up to rounding error and keeps prob 1.0
+
+        self._alias_prob = prob
+        self._alias_idx = alias
+
+    def _sample_bernoulli(self, u, rng):
+        """
+        Bernoulli race: proposes a child uniformly and accepts it with
+        probability freq / max freq, retrying on rejection. Needs no table, but
+        takes max freq / mean freq attempts on average, so it is only used on
+        flat nodes. Called from sample_child, which fills _child_list and
+        _max_freq first.
+
+        Args:
+            u: A uniform random number in [0, 1), drawn by the caller, for the
+               first proposal.
+            rng: numpy Generator drawing a fresh uniform for every retry;
+                 rescaling the leftover of u instead runs out of precision
+                 after a few proposals at high fan-out.
+        """
+        children = self._child_list
+        n = len(children)
+        max_freq = self._max_freq
+        while True:
+            u *= n
+            i = min(int(u), n - 1)
+            u -= i
+            if u * max_freq < children[i].freq:
+                return children[i]
+            u = rng.random()
+
+    def sample_child(self, u, rng=None):
+        """
+        Picks a child with probability proportional to its freq.
+
+        Args:
+            u: A uniform random number in [0, 1), drawn by the caller.
+            rng: numpy Generator for the extra uniforms of a Bernoulli race.
+                 Without it, flat nodes are sampled through the alias table.
+        """
+        children = self._child_list
+        if children is None:
+            children = self._child_list = list(self.children_map.values())
+        n = len(children)
+        if n >= ALIAS_MIN_CHILDREN:
+            if self._max_freq is None:
+                self._max_freq = max(child.freq for child in children)
+                self._total = sum(child.freq for child in children)
+            if rng is not None and self._max_freq * n <= RACE_MAX_RATIO * self._total:
+                return self._sample_bernoulli(u, rng)
+            if self._alias_prob is None:
+                self.build_alias()
+            # One uniform gives both the bucket and the coin flip inside it
+            u *= n
+            i = int(u)
+            return children[i if u - i < self._alias_prob[i] else self._alias_idx[i]]
+        cum, total = self.cumulative_weights()
+        return children[bisect(cum, u * total)]
+
+    def analyze_tree_metrics(self):
+        """
+        Walks the tree rooted at this node and collects summary statistics.
+
+        The walk uses an explicit stack, so deep trees do not hit the
+        recursion limit.
+
+        Returns:
+            dict: Node count, leaf count, maximum depth, average leaf depth,
+                  average branching factor of the internal nodes and the total
+                  freq of this node's children.
+        """
+        leaf_depths = []
+        branching = []
+
+        stack = deque([(self, 0)])
+        while stack:
+            node, depth = stack.pop()
+            if node.is_leaf():
+                leaf_depths.append(depth)
+                continue
+            branching.append(len(node.children))
+            stack.extend((child, depth + 1) for child in node.children)
+
+        return {
+            "Number of Nodes": len(leaf_depths) + len(branching),
+            "Number of Leaves": len(leaf_depths),
+            "Max Depth": max(leaf_depths),
+            "Average Depth": sum(leaf_depths) / len(leaf_depths),
+            "Average Branching": sum(branching) / len(branching) if branching else 0,
+            "Total freq": sum(child.freq for child in self.children)
+        }
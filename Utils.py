@@ -5,10 +5,37 @@ import json
 from pathlib import Path
 import re
 from collections import defaultdict
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 from music21 import harmony, roman, key
+from maestro_to_vector import (interval_arrays_to_note_vector, decode_interval_arrays,
+                               load_interval_arrays, replace_file)
+import numpy as np
 # Using standard library for stats
 from statistics import quantiles, median, stdev
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+@lru_cache(maxsize=None)
+def _get_key(song_key):
+    return key.Key(song_key)
+
+
+@lru_cache(maxsize=None)
+def _chord_to_roman(ch, song_key):
+    # The same (chord, key) pairs recur across a whole corpus, so each
+    # music21 analysis is done once
+    try:
+        cs = harmony.ChordSymbol(ch)
+        rn = roman.romanNumeralFromChord(cs, _get_key(song_key))
+        return str(rn.figure)
+    except Exception:
+        return "N"
+
 
 def chords_to_roman(chord_list, song_key):
     """
@@ -17,22 +44,11 @@ def chords_to_roman(chord_list, song_key):
     if song_key:
         if ":" in song_key:
             song_key = song_key.split(":")[0].strip()
-    k = key.Key(song_key)
-    roman_list = []
+    # Raises for an invalid key, before any chord is converted
+    _get_key(song_key)
 
-    for ch in chord_list:
-        if not ch or ch == "N":
-            roman_list.append("N")
-            continue
-
-        try:
-            cs = harmony.ChordSymbol(ch)
-            rn = roman.romanNumeralFromChord(cs, k)
-            roman_list.append(str(rn.figure))
-        except Exception:
-            roman_list.append("N")
-
-    return roman_list
+    return ["N" if not ch or ch == "N" else _chord_to_roman(ch, song_key)
+            for ch in chord_list]
 
 
 # Mapping regex patterns for canonical names
@@ -47,12 +63,17 @@ mapping = {
 }
 
 
+# Compiled once at import, in mapping's priority order
+compiled_mapping = [(base, re.compile(pattern, re.IGNORECASE))
+                    for base, pattern in mapping.items()]
+
+
+@lru_cache(maxsize=1024)
 def normalize_label(label):
-    label_lower = label.lower()
-    for base in mapping.keys():
-        if base in label_lower:
+    for base, pattern in compiled_mapping:
+        if pattern.search(label):
             return base
-    return label_lower  # keep as is if no match
+    return label.lower()  # keep as is if no match
 
 
 # if __name__ == "__main__":
@@ -92,30 +113,40 @@ def normalize_label(label):
     #     chord_code, chords_decompress_dict[norm_label])
 
 
+def _process_file(p):
+    """
+    Extracts all Roman chords of one song file, ignoring sections.
+    """
+    with open(p, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    song_chords = []
+
+    for section in data:
+        # Convert section's original chords to Roman numerals
+        chord_data = chords_to_roman(
+            section["chords"]["original"], section["key"])
+        song_chords.extend(chord_data)
+
+    return song_chords
+
+
 def get_songs(file_path="BeatlesMerged", output_path="all_songs_chords.json"):
     """
     Reads all .json song files in the given folder, extracts all Roman chords
     (ignoring sections), and saves the resulting list to a JSON file.
 
+    The files are processed in parallel worker processes, each with its own
+    chord cache.
+
     Returns:
         chords_per_song (list): A list where each element is a list of Roman chords for one song.
     """
     folder = Path(file_path)
-    chords_per_song = []
 
-    for p in folder.glob("*.json"):
-        with open(p, "r", encoding="utf-8") as f:
-            data = json.load(f)
-
-        song_chords = []
-
-        for section in data:
-            # Convert section's original chords to Roman numerals
-            chord_data = chords_to_roman(
-                section["chords"]["original"], section["key"])
-            song_chords.extend(chord_data)
-
-        chords_per_song.append(song_chords)
+    with ProcessPoolExecutor() as ex:
+        chords_per_song = list(
+            ex.map(_process_file, folder.glob("*.json"), chunksize=4))
 
     # Save the full list of chord sequences to JSON
     with open(output_path, "w", encoding="utf-8") as f:
@@ -137,13 +168,154 @@ def load_songs(json_path="all_songs_chords.json"):
     return chords_per_song
 
 
+def _song_vector(song):
+    # Files written before the intervals were packed store the plain vector
+    if "vector" in song:
+        return song["vector"]
+    return interval_arrays_to_note_vector(*decode_interval_arrays(song))
+
+
+def _is_npy_dataset(file_path):
+    # process_folder_to_npy output is named by its prefix and found by its
+    # index file; any .json path (in any case) is a JSON file
+    return (Path(file_path).suffix.lower() != ".json"
+            and Path(f"{file_path}_index.npy").exists())
+
+
+def _dataset_file(file_path):
+    # The file whose size and mtime identify a dataset's version: the JSON
+    # file, or the index of an npy prefix, which is written last
+    if _is_npy_dataset(file_path):
+        return Path(f"{file_path}_index.npy")
+    return Path(file_path)
+
+
 def load_midi(file_path="delta_notes.json"):
-    with open(file_path, "r", encoding="utf-8") as f:
-        midi_songs = json.load(f)
-    midi_songs = [song["vector"] for song in midi_songs]
+    """
+    Loads the interval vectors saved by maestro_to_vector.py: a JSON file
+    holding them either packed ("d"/"c", see
+    maestro_to_vector.encode_interval_arrays) or as plain "vector" lists, or
+    the prefix of the arrays saved by maestro_to_vector.process_folder_to_npy.
+
+    Chords are stored as JSON lists; they are converted to tuples so every
+    symbol is hashable and can be used as a key in Node.children_map.
+
+    Returns:
+        list: A list of songs, each a list of int (note) / tuple (chord) symbols.
+    """
+    if _is_npy_dataset(file_path):
+        songs, _ = load_interval_arrays(file_path)
+        return [[tuple(s) if isinstance(s, list) else s
+                 for s in interval_arrays_to_note_vector(deltas, chord_lens)]
+                for deltas, chord_lens in songs]
+
+    if not Path(file_path).exists():
+        raise FileNotFoundError(
+            f"No MIDI data at '{file_path}': expected a JSON file written by "
+            f"process_folder_to_json or the prefix of the arrays written by "
+            f"process_folder_to_npy ('{file_path}_index.npy' and its siblings)")
+
+    if orjson is not None:
+        with open(file_path, "rb") as f:
+            midi_songs = orjson.loads(f.read())
+    else:
+        with open(file_path, "r", encoding="utf-8") as f:
+            midi_songs = json.load(f)
+    midi_songs = [[tuple(s) if isinstance(s, list) else s for s in _song_vector(song)]
+                  for song in midi_songs]
     return midi_songs
 
 
+def load_midi_ids(file_path="delta_notes.json", cache_prefix="delta_notes"):
+    """
+    Loads the songs as int32 arrays of symbol ids (see encode_symbols).
+
+    The first call parses the data and writes the ids of all songs as one flat
+    int32 file ({cache_prefix}_ids.i32), the per-song offsets into it
+    ({cache_prefix}_offsets.i64), the vocabulary ({cache_prefix}_vocabulary.json)
+    and the path, size and mtime of the data they came from
+    ({cache_prefix}_source.json). Later calls memory-map the ids file for as
+    long as the data is unchanged, so every song is a zero-copy view. If the
+    data file is gone, a cache recorded for the same path is used as is.
+    file_path is anything load_midi reads.
+
+    Each song ends before its first 0 interval: the tree builders have always
+    stopped reading a song there, and cutting it here keeps that check out of
+    their inner loops.
+
+    Returns:
+        tuple: (list of np.int32 arrays, one per song, vocabulary list mapping id -> symbol)
+    """
+    ids_path = Path(f"{cache_prefix}_ids.i32")
+    offsets_path = Path(f"{cache_prefix}_offsets.i64")
+    vocabulary_path = Path(f"{cache_prefix}_vocabulary.json")
+    source_path = Path(f"{cache_prefix}_source.json")
+
+    data_file = _dataset_file(file_path)
+    source = {"path": str(Path(file_path).resolve())}
+    if data_file.exists():
+        stat = data_file.stat()
+        source.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+
+    cached_source = None
+    if ids_path.exists() and offsets_path.exists() and vocabulary_path.exists() \
+            and source_path.exists():
+        with open(source_path, "r", encoding="utf-8") as f:
+            cached_source = json.load(f)
+    # Without the data file only its path can be compared
+    fresh = cached_source is not None and (
+        cached_source == source if data_file.exists()
+        else cached_source.get("path") == source["path"])
+
+    if not fresh:
+        songs, vocabulary = encode_symbols(load_midi(file_path))
+        source_path.unlink(missing_ok=True)
+        offsets = np.zeros(len(songs) + 1, dtype=np.int64)
+        np.cumsum([len(song) for song in songs], out=offsets[1:])
+        ids = np.fromiter((s for song in songs for s in song), dtype=np.int32)
+        # Each file is renamed into place rather than rewritten, so the views
+        # of earlier calls keep mapping the old ids instead of being truncated
+        replace_file(offsets_path, offsets.tofile)
+        replace_file(vocabulary_path, lambda f: f.write(json.dumps(vocabulary).encode("utf-8")))
+        replace_file(ids_path, ids.tofile)
+        # Written last, it marks the cache as complete
+        replace_file(source_path, lambda f: f.write(json.dumps(source).encode("utf-8")))
+
+    offsets = np.fromfile(offsets_path, dtype=np.int64)
+    # np.memmap cannot map an empty file
+    if offsets[-1]:
+        ids = np.memmap(ids_path, dtype=np.int32, mode="r")
+    else:
+        ids = np.zeros(0, dtype=np.int32)
+    with open(vocabulary_path, "r", encoding="utf-8") as f:
+        vocabulary = [tuple(s) if isinstance(s, list) else s for s in json.load(f)]
+
+    starts = offsets[:-1]
+    ends = offsets[1:].copy()
+    zeros = np.flatnonzero(ids == 0)
+    if len(zeros):
+        first_zero = np.searchsorted(zeros, starts)
+        has_zero = first_zero < len(zeros)
+        ends[has_zero] = np.minimum(ends[has_zero], zeros[first_zero[has_zero]])
+
+    return [ids[start:end] for start, end in zip(starts, ends)], vocabulary
+
+
+def encode_symbols(songs):
+    """
+    Replaces every symbol with a small integer id, so the tree is keyed on ints
+    instead of hashing chord tuples on every lookup.
+
+    Id 0 is always the 0 interval, where load_midi_ids cuts the songs.
+
+    Returns:
+        tuple: (songs as lists of ids, vocabulary list mapping id -> symbol)
+    """
+    ids = {0: 0}
+    encoded = [[ids.setdefault(s, len(ids)) for s in song] for song in songs]
+    return encoded, list(ids)
+
+
 def calculate_box_plot_stats(values):
     """
     Calculates the 5 essential box plot statistics: Min, Q1, Median, Q3, Max.
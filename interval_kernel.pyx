@@ -0,0 +1,58 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+# distutils: extra_compile_args = -O3 -march=native
+"""
+Ahead-of-time compiled build of maestro_to_vector.compute_intervals, for
+setups without numba. Build it in place next to maestro_to_vector.py with:
+
+    cythonize -i interval_kernel.pyx
+"""
+from libc.stdint cimport int8_t, int16_t, int64_t
+
+# symusic gives the onsets in ticks, music21 in quarter lengths
+ctypedef fused offset_t:
+    int64_t
+    double
+
+
+def compute_intervals(const offset_t[::1] offsets, const int16_t[::1] pitches,
+                      int8_t[::1] out, int64_t[::1] event_lens):
+    """
+    Same as maestro_to_vector.compute_intervals: groups the sorted notes into
+    events, writes every pitch's interval to its reference pitch into out and
+    every event's length into event_lens, and returns the number of events.
+    """
+    cdef Py_ssize_t n = pitches.shape[0]
+    cdef Py_ssize_t n_events = 0
+    cdef Py_ssize_t prev_lo = 0, prev_hi = 0, lo = 0, hi, j
+    cdef int reference, min_current, delta_abs, min_delta_abs
+
+    for hi in range(1, n + 1):
+        if hi < n and offsets[hi] == offsets[lo]:
+            continue
+
+        if n_events == 0:
+            reference = 60
+        elif prev_hi - prev_lo == 1:
+            # Case 1: The previous event was a single note. Use it as the reference.
+            reference = pitches[prev_lo]
+        else:
+            # Case 2: The previous event was a chord. Take its first pitch with
+            # the smallest distance to the current lowest pitch.
+            min_current = pitches[lo]
+            reference = pitches[prev_lo]
+            min_delta_abs = abs(reference - min_current)
+            for j in range(prev_lo + 1, prev_hi):
+                delta_abs = abs(pitches[j] - min_current)
+                if delta_abs < min_delta_abs:
+                    min_delta_abs = delta_abs
+                    reference = pitches[j]
+
+        for j in range(lo, hi):
+            out[j] = <int8_t>(pitches[j] - reference)
+
+        event_lens[n_events] = hi - lo
+        n_events += 1
+        prev_lo = lo
+        prev_hi = hi
+        lo = hi
+    return n_events
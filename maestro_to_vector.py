@@ -1,20 +1,272 @@
 import music21 as m21
 import os
 import json
-from typing import List, Dict, Union, Any
+from typing import List, Dict, Union, Any, Optional, Tuple, Iterator
 import random
+import base64
+import zlib
+import hashlib
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    # Without numba compute_intervals runs as the Cython build in
+    # interval_kernel.pyx if it was compiled, or else as NumPy array operations
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        return lambda func: func
+
+try:
+    from symusic import Score
+except ImportError:
+    # Without symusic the MIDI files are parsed with music21
+    Score = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _dumps(obj) -> bytes:
+    # Compact JSON as bytes, encoded with orjson when it is installed
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+def _loads(data: bytes):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
 
 # --- Main Conversion Function ---
 
 
-def midi_to_note_vector(midi_filepath: str) -> List[Union[int, List[int]]]:
+@njit(cache=True)
+def compute_intervals(offsets, pitches, out, event_lens):
     """
-    Reads a MIDI file, parses it using music21, and returns a sequential
-    vector of PITCH INTERVALS (deltas).
+    Groups the notes into events and writes the interval of every pitch to its
+    reference pitch into out, in a single pass.
 
-    The output structure is a list where each element is:
-    - An integer (the interval in semitones) for a single Note.
-    - A list of integers (intervals in semitones) for a Chord.
+    offsets and pitches are sorted by offset, then pitch; notes sharing an
+    offset form one event, so event i is a run pitches[lo:hi] from low to high.
+    The reference is the previous event's pitch if it was a single note, or,
+    if it was a chord, its pitch closest to the current event's lowest pitch.
+    The first event is measured from Middle C (MIDI 60).
+
+    The number of pitches of every event goes to event_lens, which needs room
+    for one entry per note; returns the number of events.
+    """
+    n = len(pitches)
+    n_events = 0
+    prev_lo = 0
+    prev_hi = 0
+    lo = 0
+    for hi in range(1, n + 1):
+        if hi < n and offsets[hi] == offsets[lo]:
+            continue
+
+        if n_events == 0:
+            reference = 60
+        elif prev_hi - prev_lo == 1:
+            # Case 1: The previous event was a single note. Use it as the reference.
+            reference = pitches[prev_lo]
+        else:
+            # Case 2: The previous event was a chord. Take its first pitch with
+            # the smallest distance to the current lowest pitch, as one
+            # argmin reduction instead of a compare-and-branch loop.
+            last_pitches = pitches[prev_lo:prev_hi]
+            reference = last_pitches[np.argmin(np.abs(last_pitches - pitches[lo]))]
+
+        for j in range(lo, hi):
+            out[j] = pitches[j] - reference
+
+        event_lens[n_events] = hi - lo
+        n_events += 1
+        prev_lo = lo
+        prev_hi = hi
+        lo = hi
+    return n_events
+
+
+def _compute_intervals_numpy(offsets, pitches, out, event_lens):
+    """
+    compute_intervals as NumPy array operations, for setups with neither
+    numba nor the Cython kernel.
+
+    Single notes, by far the most common events in piano music, are the
+    reference of the next event as they are, so all references are first
+    gathered in one step. Only the events after a chord then search that
+    chord for their closest pitch, in a Python loop.
+    """
+    n = len(pitches)
+    starts = np.concatenate(([0], np.flatnonzero(offsets[1:] != offsets[:-1]) + 1))
+    lens = np.diff(np.append(starts, n))
+    n_events = len(starts)
+
+    references = np.empty(n_events, dtype=np.int64)
+    references[0] = 60
+    references[1:] = pitches[starts[:-1]]
+    for i in (np.flatnonzero(lens[:-1] > 1) + 1).tolist():
+        last_pitches = pitches[starts[i - 1]:starts[i]]
+        references[i] = last_pitches[np.argmin(np.abs(last_pitches - pitches[starts[i]]))]
+
+    out[:] = pitches - np.repeat(references, lens)
+    event_lens[:n_events] = lens
+    return n_events
+
+
+if not NUMBA_AVAILABLE:
+    try:
+        from interval_kernel import compute_intervals
+    except ImportError:
+        compute_intervals = _compute_intervals_numpy
+
+
+def _read_notes_symusic(midi_filepath: str, data: Optional[bytes] = None) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Parses a MIDI file with symusic and returns the onset and pitch of every
+    note, concatenated over all tracks except the drum tracks. If data is
+    given, it holds the file's bytes, already read.
+
+    Returns:
+        (offsets in ticks, MIDI pitches) as parallel arrays, or None if the file
+        could not be parsed.
+    """
+    try:
+        score = Score.from_file(midi_filepath) if data is None else Score.from_midi(data)
+    except RuntimeError as e:
+        print(f"Error parsing MIDI file '{midi_filepath}' and skipping: {e}")
+        return None
+
+    # Drum tracks hold percussion sounds rather than pitches, so they are left
+    # out, as are tracks without notes
+    tracks = [track.notes.numpy() for track in score.tracks
+              if not track.is_drum and len(track.notes)]
+    offsets = np.concatenate([t['time'] for t in tracks] + [np.empty(0, np.int32)])
+    pitches = np.concatenate([t['pitch'] for t in tracks] + [np.empty(0, np.int8)])
+    return offsets.astype(np.int64), pitches.astype(np.int16)
+
+
+def _append_note(element, offset, offsets: List[float], pitches: List[int]):
+    offsets.append(offset)
+    pitches.append(element.pitch.midi)
+
+
+def _append_chord(element, offset, offsets: List[float], pitches: List[int]):
+    chord_pitches = element.pitches
+    offsets.extend([offset] * len(chord_pitches))
+    pitches.extend(p.midi for p in chord_pitches)
+
+
+# Appends the notes of a music21 element, by its exact class; elements of any
+# other class carry no notes. One dict lookup replaces a chain of isinstance
+# checks, and the pitches go straight into the flat lists.
+_NOTE_APPENDERS = {
+    m21.note.Note: _append_note,
+    m21.chord.Chord: _append_chord,
+}
+
+
+def _collect_notes_music21(stream, base_offset, offsets: List[float], pitches: List[int]):
+    """
+    Appends the offset (from the stream the walk started at) and MIDI pitch of
+    every Note, and of every pitch of every Chord, found under stream.
+
+    Walks the nested streams (Measures, Voices) directly, adding up their
+    offsets, instead of building the flattened copy made by stream.flat.
+    """
+    offset_of = stream.elementOffset
+    for element in stream.elements:
+        if element.isStream:
+            _collect_notes_music21(element, base_offset + offset_of(element), offsets, pitches)
+            continue
+
+        append_notes = _NOTE_APPENDERS.get(type(element))
+        if append_notes is not None:
+            append_notes(element, base_offset + offset_of(element), offsets, pitches)
+
+
+def _is_percussion(part) -> bool:
+    """
+    True if the part's instrument is a drum kit: an unpitched percussion
+    instrument, or anything on MIDI channel 10 (midiChannel 9, counted from 0).
+    """
+    # MIDI parts keep their instrument inside the first Measure, where
+    # part.getInstrument() does not look
+    instrument = part.recurse().getElementsByClass(m21.instrument.Instrument).first()
+    return instrument is not None and (
+        instrument.midiChannel == 9
+        or isinstance(instrument, m21.instrument.UnpitchedPercussion))
+
+
+_MIDI_CONVERTER = None
+
+
+def _midi_converter():
+    # One MIDI sub-converter per process, made on first use
+    global _MIDI_CONVERTER
+    if _MIDI_CONVERTER is None:
+        _MIDI_CONVERTER = m21.converter.subConverters.ConverterMidi()
+    return _MIDI_CONVERTER
+
+
+def _read_notes_music21(midi_filepath: str, data: Optional[bytes] = None) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Parses a MIDI file with music21 and returns the offset and pitch of every
+    note, with chords expanded into their pitches. Percussion parts are
+    skipped (see _is_percussion). If data is given, it holds the file's bytes,
+    already read.
+
+    Returns:
+        (offsets in quarter lengths, MIDI pitches) as parallel arrays, or None if
+        the file could not be parsed.
+    """
+    try:
+        # 1. Parse the MIDI file into a music21 Score object, straight through
+        #    the MIDI sub-converter, skipping the format detection and
+        #    converter dispatch of m21.converter.parse
+        converter = _midi_converter()
+        if data is None:
+            # parseFile adds to the converter's current stream, so start a new one
+            converter.stream = m21.stream.Score()
+            converter.parseFile(midi_filepath)
+        else:
+            converter.parseData(data)
+        score = converter.stream
+
+    except (m21.converter.ConverterException, m21.midi.MidiException) as e:
+        print(f"Error parsing MIDI file '{midi_filepath}' and skipping: {e}")
+        return None
+
+    offsets: List[float] = []
+    pitches: List[int] = []
+
+    # 2. Iterate through each Part (or track) in the score
+    for part in score.parts:
+        if _is_percussion(part):
+            continue
+
+        # 3. Collect all Notes and Chords within this part
+        _collect_notes_music21(part, 0.0, offsets, pitches)
+
+    return (np.fromiter(offsets, dtype=np.float64, count=len(offsets)),
+            np.fromiter(pitches, dtype=np.int16, count=len(pitches)))
+
+
+def midi_to_interval_arrays(midi_filepath: str, data: Optional[bytes] = None) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Reads a MIDI file, parses it (with symusic if installed, otherwise with
+    music21), and returns its PITCH INTERVALS (deltas) as two flat arrays.
+
+    All notes that start at the same offset (in any track) form one event; an
+    event with more than one pitch is a chord.
 
     Intervals are calculated relative to the previously occurring pitch. If the 
     previous event was a chord, the reference pitch is selected as the pitch 
@@ -22,148 +274,401 @@ def midi_to_note_vector(midi_filepath: str) -> List[Union[int, List[int]]]:
     to the lowest pitch of the current event.
 
     Args:
-        midi_filepath: The path to the input MIDI file (or a music21 Stream for testing).
+        midi_filepath: The path to the input MIDI file.
+        data: The file's bytes, if they were already read; otherwise the file
+              is read from midi_filepath.
 
     Returns:
-        A list of pitch intervals (deltas) represented as integers or lists of integers.
+        (deltas, chord_lens): the intervals of all events back to back as int8
+        (MIDI pitches are 0-127, so every interval fits), and the number of
+        pitches of every event as uint8 (1 for a single Note). None if the file
+        has no notes or could not be parsed.
     """
 
-    try:
-        # 1. Parse the MIDI file into a music21 Score object
-        # Handles both string filepath and direct stream objects (for testing)
-        score = m21.converter.parse(midi_filepath)
+    if Score is not None:
+        notes = _read_notes_symusic(midi_filepath, data)
+    else:
+        notes = _read_notes_music21(midi_filepath, data)
+    if notes is None or len(notes[1]) == 0:
+        return None
+    offsets, pitches = notes
+
+    # 4. Sort by offset (then pitch)
+    if np.issubdtype(offsets.dtype, np.integer):
+        # Offsets in ticks and 7-bit MIDI pitches pack into one int64 key,
+        # sorted in place: one value sort instead of a two-key lexsort and
+        # the gathers after it
+        key = (offsets << 7) | pitches
+        key.sort()
+        offsets = key >> 7
+        pitches = (key & 127).astype(np.int16)
+    else:
+        order = np.lexsort((pitches, offsets))
+        offsets = offsets[order]
+        pitches = pitches[order]
 
-    except m21.converter.ConverterException as e:
-        print(f"Error parsing MIDI file '{midi_filepath}' and skipping: {e}")
+    # 5. Split into events and calculate the relative intervals in one
+    #    compiled pass
+    deltas = np.empty(len(pitches), dtype=np.int8)
+    event_lens = np.empty(len(pitches), dtype=np.int64)
+    n_events = compute_intervals(offsets, pitches, deltas, event_lens)
+    chord_lens = event_lens[:n_events]
+
+    if chord_lens.max() > np.iinfo(np.uint8).max:
+        print(f"Error reading MIDI file '{midi_filepath}' and skipping: "
+              f"{chord_lens.max()} notes start at the same offset")
+        return None
+
+    return deltas, chord_lens.astype(np.uint8)
+
+
+def interval_arrays_to_note_vector(deltas: np.ndarray, chord_lens: np.ndarray) -> List[Union[int, List[int]]]:
+    """
+    Expands the arrays of midi_to_interval_arrays into the interval vector: a
+    list holding an integer for every single Note and a list of integers for
+    every Chord.
+    """
+    starts = np.zeros(len(chord_lens), dtype=np.int64)
+    np.cumsum(chord_lens[:-1], dtype=np.int64, out=starts[1:])
+    deltas_list = deltas.tolist()
+    return [deltas_list[lo] if n == 1 else deltas_list[lo:lo + n]
+            for lo, n in zip(starts.tolist(), chord_lens.tolist())]
+
+
+def encode_interval_arrays(deltas: np.ndarray, chord_lens: np.ndarray) -> Dict[str, Any]:
+    """
+    Packs the arrays of midi_to_interval_arrays for JSON, as the base64 of
+    their zlib-compressed bytes: {"d": deltas, "c": chord_lens, "z": True}.
+
+    The intervals cluster around 0 and most events are single notes, so
+    DEFLATE's entropy coding stores them in well under a byte each.
+    """
+    return {"d": base64.b64encode(zlib.compress(deltas.astype(np.int8).tobytes())).decode('ascii'),
+            "c": base64.b64encode(zlib.compress(chord_lens.astype(np.uint8).tobytes())).decode('ascii'),
+            "z": True}
+
+
+def decode_interval_arrays(song: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reverses encode_interval_arrays. Songs packed without "z" hold the raw,
+    uncompressed bytes.
+
+    Returns:
+        (deltas as int8, chord_lens as uint8)
+    """
+    deltas = base64.b64decode(song["d"])
+    chord_lens = base64.b64decode(song["c"])
+    if song.get("z"):
+        deltas = zlib.decompress(deltas)
+        chord_lens = zlib.decompress(chord_lens)
+    return (np.frombuffer(deltas, dtype=np.int8),
+            np.frombuffer(chord_lens, dtype=np.uint8))
+
+
+def midi_to_note_vector(midi_filepath: str) -> List[Union[int, List[int]]]:
+    """
+    Reads a MIDI file and returns a sequential vector of PITCH INTERVALS
+    (deltas), see midi_to_interval_arrays.
+
+    The output structure is a list where each element is:
+    - An integer (the interval in semitones) for a single Note.
+    - A list of integers (intervals in semitones) for a Chord.
+
+    Returns:
+        A list of pitch intervals (deltas) represented as integers or lists of integers.
+    """
+    arrays = midi_to_interval_arrays(midi_filepath)
+    if arrays is None:
         return []
+    return interval_arrays_to_note_vector(*arrays)
 
-    # Initialize intermediate storage to hold pitches and offset for sorting
-    all_note_data: List[Dict[str, Any]] = []
 
-    # 2. Iterate through each Part (or track) in the score
-    for part in score.parts:
+# Returned by _read_cache when a file has no entry yet; a cached None means
+# the file has no notes
+_CACHE_MISS = object()
 
-        # 3. Iterate over all Notes and Chords within this part, flattened by time
-        for element in part.flat.notes:
+# Part of every cache key; bumped whenever the cached entries change format or
+# content, so entries written by older code are never read
+_CACHE_VERSION = 3
 
-            # Data structure to hold offset (for sorting) and all pitches
-            data: Dict[str, Any] = {'offset': element.offset}
+# symusic and music21 do not give identical intervals for the same file, so
+# each keeps its own entries
+_PARSER = "symusic" if Score is not None else "music21"
 
-            if isinstance(element, m21.note.Note):
-                # Data for a single Note: stored as a list for uniformity
-                data['pitches'] = [element.pitch.midi]
 
-            elif isinstance(element, m21.chord.Chord):
-                # Data for a Chord: a list of MIDI pitches
-                data['pitches'] = [p.midi for p in element.pitches]
+def _cache_path(midi_filepath: str, cache_dir: Optional[str]) -> Optional[str]:
+    # The key hashes the cache version, the parser and the file's path,
+    # modification time and size, so a changed file gets a new entry
+    if cache_dir is None:
+        return None
+    try:
+        stat = os.stat(midi_filepath)
+    except OSError:
+        # Not cached; reading the file reports the error
+        return None
+    key = hashlib.blake2b(
+        f"v{_CACHE_VERSION}|{_PARSER}|{midi_filepath}|{stat.st_mtime}|{stat.st_size}".encode()
+    ).hexdigest()
+    return os.path.join(cache_dir, key[:2], f"{key}.json")
+
+
+def _read_cache(cache_path: Optional[str]):
+    if cache_path is None:
+        return _CACHE_MISS
+    try:
+        with open(cache_path, 'rb') as f:
+            return _loads(f.read())
+    except FileNotFoundError:
+        return _CACHE_MISS
 
-            all_note_data.append(data)
 
-    # 4. Sort the temporary vector by offset to ensure correct sequence
-    all_note_data.sort(key=lambda x: x['offset'])
+def replace_file(path, write):
+    """
+    Writes a file under a temporary name with write(binary file object) and
+    renames it onto path.
 
-    # 5. Process the sorted data to calculate relative intervals
-    final_vector: List[Union[int, List[int]]] = []
+    Readers never see a half-written file, and since the new file gets its own
+    inode, existing memory maps of the old one stay valid instead of being
+    truncated under their views.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
-    # Start with a reference pitch: Middle C (MIDI 60). This sets the first interval.
-    last_pitches: List[int] = [60]
 
-    for item in all_note_data:
-        current_pitches = item['pitches']
+def _write_cache(cache_path: Optional[str], song: Optional[Dict[str, Any]]):
+    if cache_path is None:
+        return
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    # Renamed into place, so a worker never reads a half-written entry
+    replace_file(cache_path, lambda f: f.write(_dumps(song)))
 
-        # --- CRITICAL LOGIC: Determine the single reference pitch from the previous event ---
-        reference_pitch: int
 
-        if not last_pitches:
-            # Should only happen if the first event was skipped/empty, but safe guard here
-            reference_pitch = 60
-        elif len(last_pitches) == 1:
-            # Case 1: The previous event was a single note. Use it as the reference.
-            reference_pitch = last_pitches[0]
-        else:
-            # Case 2: The previous event was a chord (multiple pitches).
-            # We must find the pitch from the previous chord that is closest to
-            # the current event's lowest pitch (our melodic anchor).
+def _parse_packed(midi_filepath: str, data: Optional[bytes] = None) -> Optional[Dict[str, Any]]:
+    arrays = midi_to_interval_arrays(midi_filepath, data)
+    return None if arrays is None else encode_interval_arrays(*arrays)
 
-            min_current_pitch = min(current_pitches)
 
-            min_delta_abs = float('inf')
-            closest_prev_pitch = last_pitches[0]
+def cached_midi_to_interval_arrays(midi_filepath: str, cache_dir: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    midi_to_interval_arrays, packed by encode_interval_arrays, with an on-disk
+    memo of its result.
 
-            for prev_p in last_pitches:
-                # Calculate the absolute difference (delta)
-                delta_abs = abs(prev_p - min_current_pitch)
+    The result is stored in cache_dir/<key[:2]>/<key>.json, where key hashes the
+    file's path, modification time and size, so a changed file is parsed again.
+    With cache_dir None the file is always parsed.
+    """
+    cache_path = _cache_path(midi_filepath, cache_dir)
+    song = _read_cache(cache_path)
+    if song is _CACHE_MISS:
+        song = _parse_packed(midi_filepath)
+        _write_cache(cache_path, song)
+    return song
 
-                # Check for the smallest delta (closest pitch)
-                if delta_abs < min_delta_abs:
-                    min_delta_abs = delta_abs
-                    closest_prev_pitch = prev_p
 
-            reference_pitch = closest_prev_pitch
-        # --- End Reference Pitch Determination ---
+def _read_file(filepath: str) -> Optional[bytes]:
+    try:
+        with open(filepath, 'rb') as f:
+            return f.read()
+    except OSError as e:
+        print(f"Error reading MIDI file '{filepath}' and skipping: {e}")
+        return None
 
-        # Calculate intervals (current pitch - reference pitch)
-        intervals = [p - reference_pitch for p in current_pitches]
 
-        # Update state for the next iteration
-        last_pitches = current_pitches
+def _process_chunk(filepaths: List[str], cache_dir: Optional[str]) -> List[Optional[Dict[str, Any]]]:
+    """
+    Pool worker: cached_midi_to_interval_arrays for every file of the chunk.
 
-        # Append result: single int for single note, list for chord
-        if len(intervals) == 1:
-            final_vector.append(intervals[0])
-        else:
-            final_vector.append(intervals)
+    The files missing from the cache are read by a background thread, one
+    file ahead, so the next file comes off the disk while the current one is
+    parsed. A file that cannot be read is skipped, and not cached.
+    """
+    cache_paths = [_cache_path(filepath, cache_dir) for filepath in filepaths]
+    songs = [_read_cache(cache_path) for cache_path in cache_paths]
+    misses = [i for i, song in enumerate(songs) if song is _CACHE_MISS]
 
-    return final_vector
+    with ThreadPoolExecutor(max_workers=1) as reader:
+        pending = reader.submit(_read_file, filepaths[misses[0]]) if misses else None
+        for k, i in enumerate(misses):
+            data = pending.result()
+            if k + 1 < len(misses):
+                pending = reader.submit(_read_file, filepaths[misses[k + 1]])
 
-# --- Folder Processing Function ---
+            if data is None:
+                songs[i] = None
+                continue
+            songs[i] = _parse_packed(filepaths[i], data)
+            _write_cache(cache_paths[i], songs[i])
+    return songs
 
+# --- Folder Processing Functions ---
 
-def process_folder_to_json(root_dir: str, output_filepath: str):
+
+def _process_folder(root_dir: str, cache_dir: Optional[str]) -> Iterator[Tuple[str, Optional[Dict[str, Any]]]]:
+    """
+    Processes every MIDI file under root_dir in parallel worker processes, one
+    per CPU, and yields (filepath, packed intervals or None) in the order of
+    the directory walk (see cached_midi_to_interval_arrays). Within a worker,
+    reading the next file overlaps with parsing the current one (see
+    _process_chunk).
+    """
+    print(f"Starting directory scan in: {root_dir}")
+
+    # 1. Traverse the directory tree and collect the MIDI files
+    filepaths = [os.path.join(dirpath, filename)
+                 for dirpath, dirnames, filenames in os.walk(root_dir)
+                 for filename in filenames
+                 if filename.lower().endswith(('.mid', '.midi'))]
+
+    # 2. Run the processing function on every file in parallel worker
+    #    processes, 32 files per task to amortize the IPC; each worker reads
+    #    and parses its own files, so only paths and packed intervals cross the
+    #    process boundary
+    chunks = [filepaths[i:i + 32] for i in range(0, len(filepaths), 32)]
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        chunk_songs = executor.map(partial(_process_chunk, cache_dir=cache_dir), chunks)
+
+        for chunk, songs in zip(chunks, chunk_songs):
+            for filepath, song in zip(chunk, songs):
+                print(f"Processed: {filepath}")
+                yield filepath, song
+
+
+def process_folder_to_json(root_dir: str, output_filepath: str,
+                           cache_dir: Optional[str] = "note_vector_cache"):
     """
     Traverses a root directory, processes all MIDI files found, and saves the 
     pitch interval vectors to a single JSON file.
 
+    The files are processed in parallel worker processes, one per CPU; the
+    songs keep the order of the directory walk and are streamed to the file as
+    compact JSON, one song per line. Each song holds its intervals packed by
+    encode_interval_arrays ({"filepath", "d", "c", "z"}); Utils.load_midi expands
+    them back into interval vectors.
+
     Args:
         root_dir: The starting directory to search for MIDI files.
         output_filepath: The path to save the final JSON file.
+        cache_dir: Directory memoizing each file's intervals across runs (see
+                   cached_midi_to_interval_arrays), or None to always parse.
     """
 
-    print(f"Starting directory scan in: {root_dir}")
-    all_processed_songs = []
-
-    # Traverse the directory tree
-    for dirpath, dirnames, filenames in os.walk(root_dir):
-        for filename in filenames:
-            # 1. Check if the file is a MIDI file
-            if filename.lower().endswith(('.mid', '.midi')):
-                filepath = os.path.join(dirpath, filename)
-                print(f"Processing: {filepath}")
-
-                # 2. Run the processing function
-                note_vector = midi_to_note_vector(filepath)
-
-                # 3. Add to the list if the vector is not empty
-                if note_vector:
-                    song_data = {
-                        "filepath": filepath,
-                        "vector": note_vector
-                    }
-                    all_processed_songs.append(song_data)
-
-    # 4. Save the compiled list to a single JSON file
-    if all_processed_songs:
-        try:
-            with open(output_filepath, 'w') as f:
-                json.dump(all_processed_songs, f, indent=4)
-            print(
-                f"\n✅ Successfully processed {len(all_processed_songs)} song(s).")
-            print(f"Data saved to: {output_filepath}")
-        except Exception as e:
-            print(f"\n❌ Error saving JSON file '{output_filepath}': {e}")
+    n_processed = 0
+
+    # The songs are written as they arrive, as one JSON array with one song per
+    # line, so memory does not grow with the size of the corpus. They go to a
+    # temporary file, renamed onto output_filepath once complete, so a run that
+    # aborts leaves the previous output intact.
+    tmp_path = f"{output_filepath}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(b'[')
+            for filepath, song in _process_folder(root_dir, cache_dir):
+
+                # 3. Save the song if it has any notes
+                if song:
+                    song_data = {"filepath": filepath, **song}
+                    f.write(b',\n' if n_processed else b'\n')
+                    f.write(_dumps(song_data))
+                    n_processed += 1
+            f.write(b'\n]\n')
+        os.replace(tmp_path, output_filepath)
+    except OSError as e:
+        print(f"\n❌ Error saving JSON file '{output_filepath}': {e}")
+        return
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    if n_processed:
+        print(f"\n✅ Successfully processed {n_processed} song(s).")
+        print(f"Data saved to: {output_filepath}")
     else:
         print("\n⚠️ No MIDI files were successfully processed.")
 
+
+def process_folder_to_npy(root_dir: str, output_prefix: str,
+                          cache_dir: Optional[str] = "note_vector_cache"):
+    """
+    Like process_folder_to_json, but saves the intervals of all songs as flat
+    .npy arrays, which load_interval_arrays memory-maps without parsing any
+    text:
+
+    - {output_prefix}_deltas.npy: the int8 deltas of all songs, back to back
+    - {output_prefix}_chord_lens.npy: the uint8 chord_lens of all songs
+    - {output_prefix}_paths.json: the MIDI file of every song
+    - {output_prefix}_index.npy: int64 rows (start in deltas, start in
+      chord_lens) of every song, plus one row marking the ends
+
+    Args:
+        root_dir: The starting directory to search for MIDI files.
+        output_prefix: The path prefix of the output files.
+        cache_dir: Directory memoizing each file's intervals across runs (see
+                   cached_midi_to_interval_arrays), or None to always parse.
+    """
+
+    all_deltas: List[np.ndarray] = []
+    all_chord_lens: List[np.ndarray] = []
+    filepaths: List[str] = []
+
+    for filepath, song in _process_folder(root_dir, cache_dir):
+        # 3. Keep the song if it has any notes
+        if song:
+            deltas, chord_lens = decode_interval_arrays(song)
+            all_deltas.append(deltas)
+            all_chord_lens.append(chord_lens)
+            filepaths.append(filepath)
+
+    if not filepaths:
+        print("\n⚠️ No MIDI files were successfully processed.")
+        return
+
+    index = np.zeros((len(filepaths) + 1, 2), dtype=np.int64)
+    np.cumsum([len(deltas) for deltas in all_deltas], out=index[1:, 0])
+    np.cumsum([len(chord_lens) for chord_lens in all_chord_lens], out=index[1:, 1])
+
+    try:
+        # Each file is renamed into place, leaving any memory map that
+        # load_interval_arrays holds on the previous arrays valid
+        replace_file(f"{output_prefix}_deltas.npy",
+                     lambda f: np.save(f, np.concatenate(all_deltas)))
+        replace_file(f"{output_prefix}_chord_lens.npy",
+                     lambda f: np.save(f, np.concatenate(all_chord_lens)))
+        replace_file(f"{output_prefix}_paths.json",
+                     lambda f: f.write(json.dumps(filepaths).encode('utf-8')))
+        # Written last, its mtime marks the arrays as complete
+        replace_file(f"{output_prefix}_index.npy", lambda f: np.save(f, index))
+    except OSError as e:
+        print(f"\n❌ Error saving arrays '{output_prefix}_*.npy': {e}")
+        return
+
+    print(f"\n✅ Successfully processed {len(filepaths)} song(s).")
+    print(f"Data saved to: {output_prefix}_*.npy")
+
+
+def load_interval_arrays(prefix: str) -> Tuple[List[Tuple[np.ndarray, np.ndarray]], List[str]]:
+    """
+    Loads the arrays saved by process_folder_to_npy, memory-mapped, so every
+    song is a zero-copy view.
+
+    Returns:
+        ([(deltas, chord_lens) of every song], [MIDI file of every song])
+    """
+    deltas = np.load(f"{prefix}_deltas.npy", mmap_mode='r')
+    chord_lens = np.load(f"{prefix}_chord_lens.npy", mmap_mode='r')
+    index = np.load(f"{prefix}_index.npy").tolist()
+    with open(f"{prefix}_paths.json", 'r', encoding='utf-8') as f:
+        filepaths = json.load(f)
+
+    songs = [(deltas[d_start:d_end], chord_lens[c_start:c_end])
+             for (d_start, c_start), (d_end, c_end) in zip(index[:-1], index[1:])]
+    return songs, filepaths
+
 # --- Example Usage ---
 
 